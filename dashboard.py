@@ -1,14 +1,14 @@
 import streamlit as st
 import csv
-import io
-import json
+import re
 import time
-from datetime import datetime, timedelta, timezone
+import pandas as pd
+from datetime import date, datetime, timezone
 # from k3y_open_time_shifts import (
 #     load_settings, convert_to_utc, convert_to_local,
 #     fetch_k3y_data, find_gaps, get_open_slots, VALID_TIME_ZONES
 from k3y_open_time_shifts import (
-    load_settings, get_open_slots, VALID_TIME_ZONES
+    load_settings, fetch_k3y_data, find_gaps, convert_to_utc, VALID_TIME_ZONES
 )
 
 # Page configuration
@@ -18,8 +18,42 @@ st.set_page_config(
     layout="centered"
 )
 
-# Add CSS for tooltip border styling
-st.markdown("""
+# Static widget options. Streamlit re-executes this whole script on
+# every rerun, so plain module-level constants would be rebuilt on each
+# interaction; cache_resource builds them once per process instead
+@st.cache_resource
+def _static_options():
+    hours_24 = tuple(f"{h:02d}:00" for h in range(24))
+    hours_12 = tuple(datetime.strptime(h, "%H:%M").strftime("%I:%M %p") for h in hours_24)
+    tz_options = tuple(VALID_TIME_ZONES.keys())
+    areas = tuple(f"K3Y/{i}" for i in range(10))
+    return {
+        "hours_12": hours_12,
+        "h12_to_h24": dict(zip(hours_12, hours_24)),
+        "tz": tz_options,
+        "areas": areas,
+        # Option -> position maps so default lookups are O(1) instead
+        # of a linear .index() scan per widget per rerun
+        "hour_index": {h: i for i, h in enumerate(hours_12)},
+        "tz_index": {tz: i for i, tz in enumerate(tz_options)},
+        "area_index": {area: i for i, area in enumerate(areas)},
+    }
+
+_STATIC = _static_options()
+_HOURS_12 = _STATIC["hours_12"]
+_H12_TO_H24 = _STATIC["h12_to_h24"]
+_TZ_OPTIONS = _STATIC["tz"]
+_K3Y_AREAS = _STATIC["areas"]
+_HOUR_INDEX = _STATIC["hour_index"]
+_TZ_INDEX = _STATIC["tz_index"]
+_AREA_INDEX = _STATIC["area_index"]
+
+# CSS for tooltip border styling. This must be emitted on every rerun:
+# Streamlit drops elements that a rerun does not re-render, so gating
+# the injection behind session state would lose the style after the
+# first interaction. Keeping the block a module constant at least
+# reuses one string object across runs.
+_TOOLTIP_CSS = """
 <style>
 /* Add white border to tooltips */
 div[data-baseweb="tooltip"],
@@ -29,7 +63,8 @@ div[role="tooltip"],
     box-shadow: 0 0 5px rgba(255, 255, 255, 0.5) !important;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_TOOLTIP_CSS, unsafe_allow_html=True)
 
 # Initialize settings in session state
 def initialize_settings():
@@ -49,90 +84,100 @@ def render_settings_sidebar():
     st.sidebar.header("Settings")
 
     # Time zone selector
-    time_zone_options = list(VALID_TIME_ZONES.keys())
     selected_tz = st.sidebar.selectbox(
         "Select Time Zone",
-        options=time_zone_options,
-        index=time_zone_options.index(st.session_state.settings["TIME_ZONE_ABBR"])
-              if st.session_state.settings["TIME_ZONE_ABBR"] in time_zone_options else 0
+        options=_TZ_OPTIONS,
+        index=_TZ_INDEX.get(st.session_state.settings["TIME_ZONE_ABBR"], 0)
     )
 
     # K3Y area selector
-    k3y_area_options = [f"K3Y/{i}" for i in range(10)]
     selected_area = st.sidebar.selectbox(
         "K3Y Area",
-        options=k3y_area_options,
-        index=k3y_area_options.index(st.session_state.settings["K3Y_AREA"])
-              if st.session_state.settings["K3Y_AREA"] in k3y_area_options else 0
+        options=_K3Y_AREAS,
+        index=_AREA_INDEX.get(st.session_state.settings["K3Y_AREA"], 0)
     )
 
-    # Hours in AM/PM format
-    hour_options = [(datetime.strptime(f"{h:02d}:00", "%H:%M").strftime("%I:%M %p")) for h in range(24)]
-
     default_day_start_str = st.session_state.settings["LOCAL_DAY_START"]
     default_day_end_str = st.session_state.settings["LOCAL_DAY_END"]
 
     selected_day_start_str = st.sidebar.selectbox(
         "Day Start",
-        hour_options,
-        index=hour_options.index(default_day_start_str) if default_day_start_str in hour_options else 0,
+        _HOURS_12,
+        index=_HOUR_INDEX.get(default_day_start_str, 0),
         help="Select the start time of your operating day"
     )
 
     selected_day_end_str = st.sidebar.selectbox(
         "Day End",
-        hour_options,
-        index=hour_options.index(default_day_end_str) if default_day_end_str in hour_options else 12,
+        _HOURS_12,
+        index=_HOUR_INDEX.get(default_day_end_str, 12),
         help="Select the end time of your operating day."
     )
 
-    day_start_24hr = datetime.strptime(selected_day_start_str, "%I:%M %p").strftime("%H:%M")
-    day_end_24hr = datetime.strptime(selected_day_end_str, "%I:%M %p").strftime("%H:%M")
+    day_start_24hr = _H12_TO_H24[selected_day_start_str]
+    day_end_24hr = _H12_TO_H24[selected_day_end_str]
     return selected_tz, selected_area, day_start_24hr, day_end_24hr
 
+# Build display-ready (session, local slot) pairs from raw gap tuples.
+# Runs inside the cached layer so reruns reuse the finished rows
+def _build_display_rows(gaps, selected_tz, today_utc):
+    rows = [gap for gap in gaps if gap[1]]
+    if not rows:
+        return ()
+
+    # Parse the dates once, then derive the local start/end from the
+    # structured minute offsets carried by find_gaps — no re-parsing of
+    # the slot display string (naive datetimes + fixed offset, no
+    # tz-aware dtypes)
+    gap_dates = pd.to_datetime([gap[0] for gap in rows], format="%m/%d/%y", cache=True)
+    offset_min = VALID_TIME_ZONES[selected_tz] * 60
+    starts_local = gap_dates + pd.to_timedelta([gap[2] + offset_min for gap in rows], unit="m")
+    ends_local = gap_dates + pd.to_timedelta([gap[3] + offset_min for gap in rows], unit="m")
+
+    day_labels = gap_dates.strftime("%a %b %d,")
+    start_labels = starts_local.strftime("%a %b %d, %I:%M %p")
+    end_labels = ends_local.strftime("%I:%M %p")
+    keep = gap_dates >= pd.Timestamp(today_utc)
+
+    return tuple(
+        (f"{day_label} {gap[1]}", f"{start_label} - {end_label} {selected_tz}")
+        for gap, kept, day_label, start_label, end_label in zip(
+            rows, keep, day_labels, start_labels, end_labels
+        )
+        if kept
+    )
+
 # Render table
-def render_results_table(gaps, selected_tz, key):
+def render_results_table(display_rows, selected_tz, key):
     local_col = f"Open Slot ({selected_tz})"
-    gaps_data = []
 
-    if not gaps:
-        st.info("No gaps found for selected time range!")
+    if not display_rows:
+        st.info("No available sessions match your time range.")
         return [], [], local_col
 
-    offset_hours = VALID_TIME_ZONES[selected_tz]
-    today_utc = datetime.now(timezone.utc).date()
-
-    for gap in gaps:
-        if "Open Slot (UTC)" not in gap:
-            continue
-
-        gap_date_utc = datetime.strptime(gap["Date"], "%m/%d/%y").date()
-        if gap_date_utc < today_utc:
-            continue
-
-        session_utc = f"{datetime.strptime(gap['Date'], '%m/%d/%y').strftime('%a %b %d,')} {gap['Open Slot (UTC)']}"
-
-        try:
-            utc_start_str, utc_end_str = gap["Open Slot (UTC)"].replace(" UTC", "").split(" - ")
-            start_local = datetime.strptime(f"{gap['Date']} {utc_start_str}", "%m/%d/%y %H:%M") + timedelta(hours=offset_hours)
-            end_local = datetime.strptime(f"{gap['Date']} {utc_end_str}", "%m/%d/%y %H:%M") + timedelta(hours=offset_hours)
-            local_str = f"{start_local.strftime('%a %b %d, %I:%M %p')} - {end_local.strftime('%I:%M %p')} {selected_tz}"
-        except Exception as e:
-            local_str = "Error converting time"
-            st.warning(f"Failed to convert time for {gap['Date']}: {str(e)}")
-
-        gaps_data.append({
-            "Select Time Slot": False,
-            "Session (UTC)": session_utc,
-            local_col: local_str
+    # Cheap fingerprint so checkbox-toggle reruns reuse the DataFrame
+    # built on the previous run
+    fingerprint = (selected_tz, len(display_rows), display_rows[0], display_rows[-1])
+    cached = st.session_state.get("gaps_table_cache")
+    if cached is not None and cached[0] == fingerprint:
+        gaps_data = cached[1]
+    else:
+        # Build the table as three columns instead of a dict per row;
+        # st.data_editor converts to a DataFrame internally anyway.
+        # Explicit dtypes spare Streamlit the Arrow schema inference
+        gaps_data = pd.DataFrame({
+            "Select Time Slot": pd.Series([False] * len(display_rows), dtype=bool),
+            "Session (UTC)": pd.Series([session for session, _ in display_rows], dtype="string"),
+            local_col: pd.Series([local_slot for _, local_slot in display_rows], dtype="string")
         })
+        st.session_state.gaps_table_cache = (fingerprint, gaps_data)
+
+    return _render_data_editor(gaps_data, selected_tz, local_col, key), gaps_data, local_col
 
-    if not gaps_data:
-        st.info("No available sessions match your time range.")
-        return [], [], local_col
 
+def _render_data_editor(gaps_data, selected_tz, local_col, key):
     # --- FIX: Remove 'width' from data_editor entirely ---
-    edited_df = st.data_editor(
+    return st.data_editor(
         gaps_data,
         column_config={
             "Select Time Slot": st.column_config.CheckboxColumn(
@@ -153,33 +198,45 @@ def render_results_table(gaps, selected_tz, key):
         key=key
     )
 
-    return edited_df, gaps_data, local_col
 
+# Write target for csv.writer that encodes rows to UTF-8 as they are
+# written, skipping the intermediate str buffer and its encode copy
+class _Utf8Sink:
+    def __init__(self):
+        self.buf = bytearray()
 
-# Handle copy/download
+    def write(self, s):
+        self.buf.extend(s.encode("utf-8"))
+
+# Cache the CSV payload so reruns that leave the gap data unchanged
+# (checkbox toggles, copy clicks) skip the serialization entirely
+@st.cache_data(ttl=600)
+def convert_to_csv(rows, local_col):
+    sink = _Utf8Sink()
+    writer = csv.writer(sink)
+    writer.writerow(["Session (UTC)", local_col])
+    writer.writerows(rows)
+    return bytes(sink.buf)
+
+# Handle copy/download. Runs as a fragment so clicking Copy (or the
+# download button) reruns only this block, not the whole script
+@st.fragment
 def handle_data_actions(edited_df, gaps_data, local_col):
-    selected_rows = [row for row in edited_df if row["Select Time Slot"]]
+    selected_rows = edited_df[edited_df["Select Time Slot"]]
     if st.button("📋 Copy Selected Rows", help="Generate text for email requests"):
-        if selected_rows:
-            email_body = "I would like to request the following K3Y operating times:\n"
-            formatted_rows = [f"{row['Session (UTC)']}\t {row[local_col]}" for row in selected_rows]
-            full_text = "\n".join([email_body, *formatted_rows])
+        if len(selected_rows):
+            email_body = "I would like to request the following K3Y operating times:\n\n"
+            full_text = email_body + "\n".join(
+                f"{session}\t {local_slot}"
+                for session, local_slot in zip(selected_rows["Session (UTC)"], selected_rows[local_col])
+            )
             st.code(full_text, language="text")
             st.success(f"{len(selected_rows)} slot(s) selected. Copy the message above and paste it into your email when requesting operating times.")
         else:
             st.warning("No rows selected!")
 
-    def convert_to_csv(data):
-        output = io.StringIO()
-        if data:
-            fieldnames = [key for key in data[0].keys() if key != "Select Time Slot"]
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in data:
-                writer.writerow({k: v for k, v in row.items() if k != "Select Time Slot"})
-        return output.getvalue().encode("utf-8")
-
-    csv_data = convert_to_csv(gaps_data)
+    csv_rows = tuple(zip(gaps_data["Session (UTC)"], gaps_data[local_col]))
+    csv_data = convert_to_csv(csv_rows, local_col)
     st.download_button(
         label="📥 Download table to CSV file",
         data=csv_data,
@@ -188,32 +245,37 @@ def handle_data_actions(edited_df, gaps_data, local_col):
         help="Download all open sessions for the selected settings to a CSV file."
     )
 
-# Cache settings
-@st.cache_data(ttl=600)
-def get_settings():
-    if 'settings' in st.session_state:
-        return st.session_state.settings
-    else:
-        return initialize_settings()
+# Cache the schedule fetch on its own, longer TTL: the data only
+# depends on the area, so timezone/hour tweaks reuse the same download
+@st.cache_data(ttl=1800)
+def fetch_schedule(area):
+    with st.spinner("Fetching open slots..."):
+        return fetch_k3y_data(area)
 
-# Cache open slots
+# Cache display-ready rows per settings combination on top of the
+# cached fetch. today_iso is part of the key so the past-date filter
+# rolls at day boundaries instead of lingering for the TTL
 @st.cache_data(ttl=600)
-def get_cached_open_slots(timezone, area, start_local_str, end_local_str):
+def get_display_rows(timezone, area, start_local_str, end_local_str, today_iso):
     try:
-        with st.spinner("Fetching open slots..."):
-            return get_open_slots(
-                area=area,
-                time_zone_abbr=timezone,
-                local_day_start=start_local_str,
-                local_day_end=end_local_str
-            )
+        data, update_info = fetch_schedule(area)
+        required_ranges = [(convert_to_utc(start_local_str, timezone),
+                            convert_to_utc(end_local_str, timezone))]
+        gaps = find_gaps(data, required_ranges, timezone, area)
+        # Immutable tuple of (date, slot, start/end minutes) tuples:
+        # primitives-in-tuples hash far cheaper than lists of dicts
+        gaps = tuple(
+            (g.date, g.slot_utc, g.utc_start_min, g.utc_end_min)
+            for g in gaps
+        )
+        rows = _build_display_rows(gaps, timezone, date.fromisoformat(today_iso))
+        return rows, update_info
     except Exception as e:
         st.error(f"Error fetching data: {str(e)}")
-        return [], None
+        return (), None
 
 # Initialize session state
 initialize_settings()
-settings = st.session_state.settings
 if "editor_key" not in st.session_state:
     st.session_state.editor_key = "editable_gaps_0"
 
@@ -223,7 +285,8 @@ st.title(f"K3Y Open Session Finder")
 
 refresh = st.button("🔄 Refresh Data", help="Refresh data from the server.")
 if refresh:
-    get_cached_open_slots.clear()
+    fetch_schedule.clear()
+    get_display_rows.clear()
     msg_container = st.empty()
     msg_container.success("Data refreshed!")
     time.sleep(1)
@@ -231,16 +294,21 @@ if refresh:
     key_id = int(st.session_state.editor_key.split("_")[-1])
     st.session_state.editor_key = f"editable_gaps_{key_id + 1}"
 
-gaps, update_info = get_cached_open_slots(
+display_rows, update_info = get_display_rows(
     timezone=selected_tz,
     area=selected_area,
     start_local_str=selected_day_start_str,
-    end_local_str=selected_day_end_str
+    end_local_str=selected_day_end_str,
+    today_iso=datetime.now(timezone.utc).date().isoformat()
 )
 
+# Older schedule payloads wrapped the timestamp as "(Update: ...)";
+# strip that in one precompiled pass if present
+_UPDATE_RE = re.compile(r"\(Update:\s*([^)]*)\)")
+
 if update_info:
-    update_text = ''
-    update_text = update_info.replace('(Update:', '').replace(')', '').strip()
+    match = _UPDATE_RE.search(update_info)
+    update_text = (match.group(1) if match else update_info).strip()
     st.markdown(
         f"""
         <div style="font-family: system-ui, sans-serif; font-size:12px; font-weight:500;">
@@ -253,10 +321,10 @@ if update_info:
         unsafe_allow_html=True,
     )
 
-edited_df, gaps_data, local_col = render_results_table(gaps, selected_tz, st.session_state.editor_key)
+edited_df, gaps_data, local_col = render_results_table(display_rows, selected_tz, st.session_state.editor_key)
 
 
-if gaps_data:
+if len(gaps_data):
     handle_data_actions(edited_df, gaps_data, local_col)
 
 # Sidebar footer
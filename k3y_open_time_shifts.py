@@ -1,12 +1,20 @@
 import requests
-from datetime import datetime, timedelta
+from collections import namedtuple
+from datetime import datetime
+from functools import lru_cache
 import json
 import logging
 import argparse
-from bs4 import BeautifulSoup
+import pickle
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
+# Optional faster JSON parser; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # USING argparse
 # options:
 #   -h, --help            show this help message and exit
@@ -27,12 +35,22 @@ logging.basicConfig(
     ]
 )
 
+# Shared HTTP session so repeated fetches (daemon/batch/test runs)
+# reuse the pooled TCP+TLS connection instead of a fresh handshake
+_SESSION = requests.Session()
+_SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4))
+_SESSION.headers["Accept-Encoding"] = "gzip"
+
 # Valid U.S. time zone abbreviations and their UTC offsets
 VALID_TIME_ZONES = {
-    "EST": -5, "CST": -6, "MST": -7, "PST": -8, "AKST": -9, 
+    "EST": -5, "CST": -6, "MST": -7, "PST": -8, "AKST": -9,
     "HAST": -10, "SST": -11, "CHST": 10
 }
 
+# Zone for log timestamps, constructed once (ZoneInfo caches, but the
+# lookup still costs a construction call per use)
+_EASTERN = ZoneInfo("America/New_York")
+
 # Command-line argument parsing
 def parse_args():
     parser = argparse.ArgumentParser(description="Fetch K3Y data and find available time slots.")
@@ -62,8 +80,8 @@ def update_settings_from_args(settings, args):
 # Load settings from settings.json
 def load_settings():
     try:
-        with open('settings.json', 'r') as f:
-            settings = json.load(f)
+        with open('settings.json', 'rb') as f:
+            settings = orjson.loads(f.read()) if orjson else json.load(f)
     except FileNotFoundError:
         logging.info("Loading default settings - JSON file missing")
         settings = {
@@ -77,44 +95,72 @@ def load_settings():
     return settings
 
 # Convert local time to UTC using the time zone offset
+# Only ~24x8 distinct (time, zone) pairs exist and the result depends
+# only on the time of day, so memoize the conversion
+@lru_cache(maxsize=256)
 def convert_to_utc(local_time_str, time_zone_abbr):
     if time_zone_abbr not in VALID_TIME_ZONES:
         raise ValueError(f"Invalid TIME_ZONE '{time_zone_abbr}'. Must be one of: {', '.join(VALID_TIME_ZONES)}")
     
-    today = datetime.now()  # Get today's date
     local_hour, local_minute = map(int, local_time_str.split(":"))  # Parse the local time
 
-    # Get the time zone offset
-    offset = timedelta(hours=VALID_TIME_ZONES[time_zone_abbr])
-    
-    # Create the local datetime object
-    local_dt = datetime(
-        year=today.year, month=today.month, day=today.day,
-        hour=local_hour, minute=local_minute
-    )
-
-    # Convert to UTC by subtracting the offset
-    utc_dt = local_dt - offset
-    utc_time = utc_dt.strftime("%H:%M")  # Return time in HH:MM format
-    return utc_time
+    # Subtract the offset with plain minute arithmetic; the date part
+    # was always discarded, so no datetime objects are needed (and the
+    # cached result no longer quietly depends on "today")
+    total_min = (local_hour * 60 + local_minute - VALID_TIME_ZONES[time_zone_abbr] * 60) % 1440
+    return f"{total_min // 60:02d}:{total_min % 60:02d}"  # Return time in HH:MM format
 
 # Convert UTC time to local time using the time zone offset
+# Called twice per gap by find_gaps with at most 24 hours x 8 zones of
+# distinct inputs, so memoize like convert_to_utc
+@lru_cache(maxsize=256)
 def convert_to_local(utc_time_str, time_zone_abbr):
     if time_zone_abbr not in VALID_TIME_ZONES:
         raise ValueError(f"Invalid TIME_ZONE '{time_zone_abbr}'. Must be one of: {', '.join(VALID_TIME_ZONES)}")
     
     try:
-        utc_time = datetime.strptime(utc_time_str, "%H:%M")  # Parse UTC time
-        offset = timedelta(hours=VALID_TIME_ZONES[time_zone_abbr])  # Get the time zone offset
-        local_time = utc_time + offset  # Apply the offset to get local time
-        local_time_str = local_time.strftime("%I:%M %p")  # Return time in 12-hour format
-        return local_time_str
+        utc_hour, minute = utc_time_str.split(":")  # Parse UTC time
+        # Apply the offset with int arithmetic instead of a
+        # strptime/timedelta/strftime round trip through datetime
+        local_hour = (int(utc_hour) + VALID_TIME_ZONES[time_zone_abbr]) % 24
+        suffix = "AM" if local_hour < 12 else "PM"
+        hour_12 = (local_hour + 11) % 12 + 1
+        return f"{hour_12:02d}:{int(minute):02d} {suffix}"  # Return time in 12-hour format
     except ValueError:
         return None
 
+# On-disk cache for the schedule fetch: the ETag lets the next run do a
+# conditional GET, and the pickled rows skip re-parsing on a 304
+_CACHE_DIR = Path.home() / ".cache" / "k3y"
+_CACHE_META_PATH = _CACHE_DIR / "schedule-cache.meta.json"
+_CACHE_ROWS_PATH = _CACHE_DIR / "schedule-cache-rows.pickle"
+
+# Load cached rows + metadata if present; returns (meta, rows) or None
+def _load_schedule_cache(area):
+    try:
+        with _CACHE_META_PATH.open("rb") as f:
+            meta = orjson.loads(f.read()) if orjson else json.load(f)
+        if meta.get("area") != area or not meta.get("etag"):
+            return None
+        with _CACHE_ROWS_PATH.open("rb") as f:
+            return meta, pickle.load(f)
+    except (OSError, ValueError, pickle.PickleError):
+        return None
+
+# Persist rows + metadata; a cache-write failure is never fatal
+def _save_schedule_cache(area, etag, generated_utc, rows):
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with _CACHE_ROWS_PATH.open("wb") as f:
+            pickle.dump(rows, f)
+        with _CACHE_META_PATH.open("w", encoding="utf-8") as f:
+            json.dump({"area": area, "etag": etag, "generated_utc": generated_utc}, f)
+    except OSError as e:
+        logging.warning(f"Could not write schedule cache: {e}")
+
 # Fetch K3Y data from Github (or local override)
 def fetch_k3y_data(area):
-    logging.info(f"Fetching data  {datetime.now(ZoneInfo('America/New_York')):%Y-%m-%d %H:%M:%S %Z}")
+    logging.info(f"Fetching data  {datetime.now(_EASTERN):%Y-%m-%d %H:%M:%S %Z}")
     update_info = None
 
     GITHUB_SCHEDULE_URL = (
@@ -132,102 +178,149 @@ def fetch_k3y_data(area):
             data = json.load(f)
     else:
         logging.info("Fetching schedule-cache.json from GitHub")
-        resp = requests.get(GITHUB_SCHEDULE_URL, timeout=20)
+        cached = _load_schedule_cache(area)
+        headers = {"If-None-Match": cached[0]["etag"]} if cached else None
+        resp = _SESSION.get(GITHUB_SCHEDULE_URL, timeout=20, headers=headers)
+        if resp.status_code == 304 and cached:
+            meta, rows = cached
+            logging.info(f"Schedule unchanged (HTTP 304); using {len(rows)} cached rows")
+            return rows, meta.get("generated_utc")
         resp.raise_for_status()
-        data = resp.json()
+        data = orjson.loads(resp.content) if orjson else resp.json()
 
     records = data["records"]
     generated_utc = data.get("generated_utc")
 
     update_info = generated_utc
 
+    # Filter by area here so find_gaps doesn't re-test every row
     rows = [
         (
             d["session_date"],
             d["utc_start"],
             d["utc_end"],
-            d["k3y_area"],
         )
         for d in records
+        if area in d["k3y_area"]
     ]
 
     logging.info(
-        f"Found {len(rows)} in the json data"
+        f"Found {len(rows)} rows for area {area} in the json data"
         + (f" (cache generated {generated_utc} UTC)" if generated_utc else "")
     )
-    with open("output.txt", "w", encoding="utf-8") as f:
-        for row in rows:
-            f.write(", ".join(str(x) for x in row) + "\n")
+    if not (local_path and local_path.exists()) and resp.headers.get("ETag"):
+        _save_schedule_cache(area, resp.headers["ETag"], generated_utc, rows)
     return rows, update_info
 
 
-# Generate a list of full hour time slots between start_time and end_time
+# Generate the full hour time slots between start_time and end_time.
+# The same (start, end) pairs repeat for every scheduled row, so the
+# result is memoized; it is a tuple so cached values stay immutable
+@lru_cache(maxsize=512)
 def generate_hours(start_time, end_time):
-    start = datetime.strptime(start_time, "%H:%M")  # Convert start time to datetime object
-    end = datetime.strptime(end_time, "%H:%M")  # Convert end time to datetime object
-    hours = []
+    start_min = int(start_time[:2]) * 60 + int(start_time[3:5])
+    end_min = int(end_time[:2]) * 60 + int(end_time[3:5])
 
     # If the end time is earlier than the start time, adjust to span the next day
-    if end < start:
-        end += timedelta(days=1)
-
-    # Generate hourly slots
-    current = start
-    while current < end:
-        hours.append(current.strftime("%H:00"))  # Append each full hour
-        current += timedelta(hours=1)
-
-    return hours
+    if end_min < start_min:
+        end_min += 1440
+
+    # One slot per started hour between the endpoints, labelled by the
+    # floored hour — same result as the old strptime/timedelta walk
+    start_h = start_min // 60
+    count = (end_min - start_min + 59) // 60
+    return tuple(f"{(start_h + k) % 24:02d}:00" for k in range(count))
+
+# Bitmask of the hours a full day can offer (00-22; like
+# generate_hours, the schedule historically stops short of 23:00)
+_FULL_DAY_MASK = (1 << 23) - 1
+
+# Build a 24-bit mask (bit h = hour h scheduled) for an "HH:MM" range,
+# wrapping past midnight like generate_hours does
+@lru_cache(maxsize=512)
+def _hours_to_mask(start_time, end_time):
+    start_h = int(start_time[:2])
+    end_h = int(end_time[:2])
+    if end_h < start_h:
+        end_h += 24
+    mask = 0
+    for h in range(start_h, end_h):
+        mask |= 1 << (h % 24)
+    return mask
+
+# One record per open hour. A namedtuple instead of a dict: fixed
+# fields, slot-based attribute access, and no per-timezone key names
+Gap = namedtuple("Gap", ["date", "slot_utc", "slot_local", "utc_start_min", "utc_end_min"])
 
 # Find gaps between scheduled times based on required ranges
 def find_gaps(data, required_ranges, time_zone_abbr, area):
-    # Initialize a dictionary to track scheduled hours by date
-    daily_hours = {}
-
-    # Update daily hours with scheduled slots
-    for date, start, end, k3y_area in data:
-        if area in k3y_area:  # Filter by the selected area
-            if date not in daily_hours:
-                daily_hours[date] = set()
-            hours = generate_hours(start, end)  # Generate blocked hours
-            daily_hours[date].update(hours)
+    # Track each day's OPEN hours as a 24-bit mask, clearing scheduled
+    # bits as rows arrive — no separate blocked-set pass or per-date
+    # complement needed (rows are already filtered to the selected area
+    # by the fetcher)
+    daily_open = {}
+    for date, start, end in data:
+        daily_open[date] = daily_open.get(date, _FULL_DAY_MASK) & ~_hours_to_mask(start, end)
 
     gaps = []
 
-    # Iterate over each date and find open slots
-    for date, scheduled_hours in daily_hours.items():
-        full_day_schedule = set(generate_hours("00:00", "23:00"))  # Full 24-hour schedule
-        open_slots = full_day_schedule - scheduled_hours  # Find open slots
+    # The zone is fixed for the whole call and only 24 UTC hours exist,
+    # so build the local labels up front and index them by hour below
+    local_labels = [convert_to_local(f"{h:02d}:00", time_zone_abbr) for h in range(24)]
+
+    # The range masks are loop-invariant; build them once, not per date
+    range_masks = [_hours_to_mask(start, end) for start, end in required_ranges]
 
+    # Iterate over each date and find open slots
+    for date, open_mask in daily_open.items():
         # Check if open slots overlap with required ranges
-        for start, end in required_ranges:
-            for hour in generate_hours(start, end):
-                if hour in open_slots:
-                    start_time = datetime.strptime(hour, "%H:%M")
-                    end_time = start_time + timedelta(hours=1)  # Calculate end time
-                    gap_start_local = convert_to_local(hour, time_zone_abbr)  # Convert to local time
-                    gap_end_local = convert_to_local(end_time.strftime("%H:%M"), time_zone_abbr)  # Convert to local time
-
-                    gap_label = f"Open Slot ({time_zone_abbr})"
-                    gaps.append({
-                        "Date": f"{date}",
-                        "Open Slot (UTC)": f"{hour} - {end_time.strftime('%H:%M')} UTC",
-                        gap_label: f"{gap_start_local} - {gap_end_local}"
-                    })
-    
+        for range_mask in range_masks:
+            candidates = range_mask & open_mask
+            while candidates:
+                bit = candidates & -candidates  # Lowest open hour
+                candidates ^= bit
+                hour_int = bit.bit_length() - 1
+                hour = f"{hour_int:02d}:00"
+                end_hour = f"{(hour_int + 1) % 24:02d}:00"
+                gap_start_local = local_labels[hour_int]  # Convert to local time
+                gap_end_local = local_labels[(hour_int + 1) % 24]  # Convert to local time
+
+                gaps.append(Gap(
+                    date=date,
+                    slot_utc=f"{hour} - {end_hour} UTC",
+                    slot_local=f"{gap_start_local} - {gap_end_local}",
+                    utc_start_min=hour_int * 60,
+                    utc_end_min=(hour_int + 1) * 60
+                ))
+
     logging.info(f"Found {len(gaps)} open slots for area {area}")
 
-     # Sort gaps by date and time
-    gaps.sort(key=lambda x: (x['Date'], datetime.strptime(x['Open Slot (UTC)'].split(' ')[0], "%H:%M")))
+     # Sort gaps by date and time (the structured minutes field spares
+     # an O(N log N) strptime of the slot string). Each distinct
+     # MM/DD/YY date is split into a (yy, mm, dd) ordinal once, so the
+     # sort compares small int tuples and orders correctly even across
+     # a year boundary
+    date_ord = {
+        d: (int(d[6:8]), int(d[0:2]), int(d[3:5]))
+        for d in daily_open
+    }
+    gaps.sort(key=lambda g: (date_ord[g.date], g.utc_start_min))
     return gaps
 
+# Convert the configured local day window into UTC required ranges.
+# Constant for a given settings combination, so memoized for long-lived
+# processes that call get_open_slots repeatedly
+@lru_cache(maxsize=32)
+def _required_ranges_utc(local_day_start, local_day_end, time_zone_abbr):
+    return ((convert_to_utc(local_day_start, time_zone_abbr),
+             convert_to_utc(local_day_end, time_zone_abbr)),)
+
 # Main function to find open time slots for the specified time ranges
 def get_open_slots(area, time_zone_abbr, local_day_start, local_day_end):
     #, url='https://www.skccgroup.com/k3y/slot_list.php'):
     #data, update_info = fetch_k3y_data(url, area)  # Fetch K3Y data from the website
     data, update_info = fetch_k3y_data(area)  # Fetch K3Y data from the website
-    required_ranges = [(convert_to_utc(local_day_start, time_zone_abbr), 
-                       convert_to_utc(local_day_end, time_zone_abbr))]  # Required time range in UTC
+    required_ranges = _required_ranges_utc(local_day_start, local_day_end, time_zone_abbr)  # Required time range in UTC
     gaps = find_gaps(data, required_ranges, time_zone_abbr, area)  # Find gaps in the data
     logging.info(f"Open slots are in: {local_day_start} - {local_day_end} {time_zone_abbr}")
 
@@ -268,20 +361,26 @@ if __name__ == "__main__":
     if gaps:
         print(f"\n\t {'Open Slot (UTC)'}\t\t\t\t\t\t{'Open Slot ({})'.format(settings['TIME_ZONE_ABBR'])}")
         
+        # Format each distinct date once; every gap on a date shares it
+        date_display = {
+            d: datetime.strptime(d, '%m/%d/%y').strftime('%a %b %d')
+            for d in {g.date for g in gaps}
+        }
+
         previous_date = None
         for gap in gaps:
-            if gap['Date'] != previous_date:
+            if gap.date != previous_date:
                 if previous_date is not None:
                     print()
-                previous_date = gap['Date']
+                previous_date = gap.date
+            day_label = date_display[gap.date]
             print(
-                f"{datetime.strptime(gap['Date'], '%m/%d/%y').strftime('%a %b %d')}, "
-                f"{gap['Open Slot (UTC)']:<22}"
+                f"{day_label}, "
+                f"{gap.slot_utc:<22}"
                 f"convert to timezone ->   "
-                f"{datetime.strptime(gap['Date'], '%m/%d/%y').strftime('%a %b %d')}, "
-                f"{gap[f'Open Slot ({settings['TIME_ZONE_ABBR']})']} "
+                f"{day_label}, "
+                f"{gap.slot_local} "
                 f"{settings['TIME_ZONE_ABBR']}"
-
             )
     else:
         print("\nNo open slots found for the specified time range.")